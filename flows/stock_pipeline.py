@@ -1,7 +1,9 @@
 from prefect import flow, task
 from prefect.tasks import task_input_hash
-from datetime import timedelta
+from prefect.utilities.hashing import hash_objects
+import hashlib
 import os
+import yaml
 from dotenv import load_dotenv
 import sys
 import subprocess
@@ -11,44 +13,145 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
+from scripts.market_calendar import DAILY_BAR_AVAILABLE, last_closed_session
+
 # Load environment variables
 load_dotenv()
 
-@task(cache_key_fn=task_input_hash, cache_expiration=timedelta(hours=24))
-def fetch_stock_data():
-    """Task to fetch stock data from Alpha Vantage"""
+dbt_project_dir = project_root / "stocks_transformations"
+
+# dbt_project.yml path settings and the defaults dbt uses when they are absent
+DBT_PATH_DEFAULTS = {
+    "model-paths": ["models"],
+    "macro-paths": ["macros"],
+    "test-paths": ["tests"],
+    "seed-paths": ["seeds"],
+    "snapshot-paths": ["snapshots"],
+    "analysis-paths": ["analyses"],
+    "docs-paths": []
+}
+
+def fetch_watermark(now=None):
+    """Return the date of the latest NYSE session whose daily bar is available
+
+    Weekends and full-day exchange holidays are skipped, and the watermark only
+    rolls to a session once Alpha Vantage has had time to publish its bar, so a
+    run just after the close doesn't cache a fetch that lacks it.
+    """
+    return last_closed_session(now, cutoff=DAILY_BAR_AVAILABLE).isoformat()
+
+def snowflake_target():
+    """Identify where the loader writes, so a new account/database/schema reloads"""
+    return {
+        "account": os.getenv("SNOWFLAKE_ACCOUNT"),
+        "database": os.getenv("SNOWFLAKE_DATABASE"),
+        "schema": os.getenv("SNOWFLAKE_SCHEMA")
+    }
+
+def file_checksum(path):
+    """Return the SHA-256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def latest_load_inputs():
+    """Pick the newest analysis files, mirroring scripts/snowflake_loader.py"""
+    analysis_dir = project_root / "tech_analysis"
+    tech_analysis_file = max(analysis_dir.glob("tech_sector_analysis_*.csv"))
+    gdp_file = max(analysis_dir.glob("gdp_data_*.csv"))
+    return (
+        str(tech_analysis_file.relative_to(project_root)),
+        str(gdp_file.relative_to(project_root))
+    )
+
+def dbt_project_hash():
+    """Hash every file dbt reads: project config, packages and all project paths"""
+    with open(dbt_project_dir / "dbt_project.yml") as f:
+        config = yaml.safe_load(f) or {}
+
+    files = [
+        dbt_project_dir / name
+        for name in ("dbt_project.yml", "packages.yml", "dependencies.yml")
+        if (dbt_project_dir / name).is_file()
+    ]
+    for key, default in DBT_PATH_DEFAULTS.items():
+        for rel_path in config.get(key, default):
+            files += (p for p in (dbt_project_dir / rel_path).rglob("*") if p.is_file())
+
+    digest = hashlib.sha256()
+    for path in sorted(set(files)):
+        # Include the path so renaming or moving a file changes the hash
+        digest.update(str(path.relative_to(dbt_project_dir)).encode())
+        digest.update(file_checksum(path).encode())
+    return digest.hexdigest()
+
+def load_version(tech_analysis_checksum, gdp_checksum):
+    """Version of the loaded source data, derived from file content only"""
+    return hashlib.sha256(f"{tech_analysis_checksum}{gdp_checksum}".encode()).hexdigest()
+
+def load_cache_key(context, parameters):
+    """Key the load on file content and target, not on the timestamped file names"""
+    target = parameters["target"]
+    return hash_objects(
+        context.task.task_key,
+        load_version(parameters["tech_analysis_checksum"], parameters["gdp_checksum"]),
+        target["account"],
+        target["database"],
+        target["schema"]
+    )
+
+# Every task is cached on its inputs only, so a rerun skips a stage exactly when
+# nothing it depends on has changed. Errors are raised rather than returned so a
+# failed run ends in a Failed state, which Prefect never caches.
+
+@task(cache_key_fn=task_input_hash)
+def fetch_stock_data(symbol, output_size, watermark):
+    """Task to fetch stock data from Alpha Vantage
+
+    `watermark` is not used by the script; it is part of the cache key so the
+    fetch reruns once a new trading session becomes available.
+    """
     try:
         subprocess.run(
-            ["python", "scripts/fetch_stock_data.py"],
+            ["python", "scripts/fetch_stock_data.py", symbol, output_size],
             check=True,
             cwd=project_root
         )
-        return True
     except subprocess.CalledProcessError as e:
         print(f"Error fetching stock data: {e}")
-        return False
+        raise
+
+@task(cache_key_fn=load_cache_key)
+def load_to_snowflake(tech_analysis_file, gdp_file, tech_analysis_checksum, gdp_checksum, target):
+    """Task to load data into Snowflake
 
-@task(cache_key_fn=task_input_hash, cache_expiration=timedelta(hours=24))
-def load_to_snowflake():
-    """Task to load data into Snowflake"""
+    Cached on the files' SHA-256 checksums and the Snowflake `target`, so
+    identical data saved under a new timestamped name is not appended again,
+    while pointing the loader at a new schema reloads it. `target` is not used
+    by the script, which reads the same environment variables. Returns the
+    load version for downstream cache keys.
+    """
     try:
         subprocess.run(
-            ["python", "scripts/snowflake_loader.py"],
+            ["python", "scripts/snowflake_loader.py", tech_analysis_file, gdp_file],
             check=True,
             cwd=project_root
         )
-        return True
     except subprocess.CalledProcessError as e:
         print(f"Error loading to Snowflake: {e}")
-        return False
+        raise
+    return load_version(tech_analysis_checksum, gdp_checksum)
 
-@task(cache_key_fn=task_input_hash, cache_expiration=timedelta(hours=24))
-def run_dbt_transformations():
-    """Task to run dbt transformations"""
+@task(cache_key_fn=task_input_hash)
+def run_dbt_transformations(project_hash, source_version, target):
+    """Task to run dbt transformations
+
+    Cached on the hash of the dbt project files, the upstream load version and
+    the Snowflake target the sources were loaded into.
+    """
     try:
-        # Change to dbt project directory
-        dbt_project_dir = project_root / "stocks_transformations"
-        
         # Run dbt commands
         commands = [
             ["dbt", "deps"],
@@ -73,36 +176,37 @@ def run_dbt_transformations():
                         print("Expected test failures occurred, continuing...")
                     else:
                         print(f"Unexpected test failures:\n{output}")
-                        return False
+                        raise RuntimeError("Unexpected dbt test failures")
             else:
                 subprocess.run(
                     cmd,
                     check=True,
                     cwd=dbt_project_dir
                 )
-        return True
     except subprocess.CalledProcessError as e:
         print(f"Error running dbt transformations: {e}")
-        return False
+        raise
 
 @flow(name="Stock Data Pipeline")
-def stock_pipeline():
+def stock_pipeline(symbol: str = "AAPL", output_size: str = "full"):
     """Main flow to orchestrate the stock data pipeline"""
     
     # Step 1: Fetch stock data
-    fetch_success = fetch_stock_data()
-    if not fetch_success:
-        raise Exception("Failed to fetch stock data")
+    fetch_stock_data(symbol, output_size, fetch_watermark())
     
-    # Step 2: Load to Snowflake
-    load_success = load_to_snowflake()
-    if not load_success:
-        raise Exception("Failed to load data to Snowflake")
+    # Step 2: Load to Snowflake, keyed on the content of the files being loaded
+    tech_analysis_file, gdp_file = latest_load_inputs()
+    target = snowflake_target()
+    source_version = load_to_snowflake(
+        tech_analysis_file=tech_analysis_file,
+        gdp_file=gdp_file,
+        tech_analysis_checksum=file_checksum(project_root / tech_analysis_file),
+        gdp_checksum=file_checksum(project_root / gdp_file),
+        target=target
+    )
     
     # Step 3: Run dbt transformations
-    transform_success = run_dbt_transformations()
-    if not transform_success:
-        raise Exception("Failed to run dbt transformations")
+    run_dbt_transformations(dbt_project_hash(), source_version, target)
     
     print("Pipeline completed successfully!")
 
@@ -1,4 +1,5 @@
 import os
+import sys
 import requests
 import pandas as pd
 from datetime import datetime
@@ -85,7 +86,7 @@ def save_to_csv(df, symbol, output_dir='data'):
     logger.info(f"Data saved to {filepath}")
     return filepath
 
-def main():
+def main(symbol='AAPL', output_size='full'):
     # Get API key from environment variable
     api_key = os.getenv('ALPHA_VANTAGE_API_KEY')
     if not api_key:
@@ -94,10 +95,9 @@ def main():
     # Initialize API client
     client = AlphaVantageAPI(api_key)
     
-    # Example usage - fetch AAPL stock data
-    symbol = 'AAPL'  # Can be modified for different stocks
+    # Fetch the requested symbol (AAPL by default)
     try:
-        df = client.fetch_daily_stock_data(symbol)
+        df = client.fetch_daily_stock_data(symbol, output_size)
         filepath = save_to_csv(df, symbol)
         logger.info(f"Successfully processed {symbol} stock data")
         logger.info(f"Total records: {len(df)}")
@@ -106,4 +106,5 @@ def main():
         raise
 
 if __name__ == "__main__":
-    main()
+    # Optional positional args: symbol, output_size
+    main(*sys.argv[1:3])
@@ -0,0 +1,94 @@
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+# US equities trade 09:30-16:00 Eastern; daily bars for a session exist only after the close
+MARKET_TZ = ZoneInfo("America/New_York")
+MARKET_OPEN = time(9, 30)
+MARKET_CLOSE = time(16, 0)
+# Alpha Vantage publishes the daily bar some time after the close
+DAILY_BAR_AVAILABLE = time(18, 0)
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    """Return the nth (1-based) given weekday of a month"""
+    first = date(year, month, 1)
+    return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+
+def _last_weekday(year: int, month: int, weekday: int) -> date:
+    """Return the last given weekday of a month"""
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+def _easter(year: int) -> date:
+    """Return Easter Sunday (anonymous Gregorian algorithm)"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+def _observed(holiday: date) -> date:
+    """Saturday holidays are observed on Friday, Sunday holidays on Monday"""
+    if holiday.weekday() == 5:
+        return holiday - timedelta(days=1)
+    if holiday.weekday() == 6:
+        return holiday + timedelta(days=1)
+    return holiday
+
+@lru_cache(maxsize=None)
+def nyse_holidays(year: int) -> frozenset:
+    """Return the full-day NYSE holidays observed in a year"""
+    holidays = {
+        _nth_weekday(year, 1, 0, 3),            # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),            # Presidents' Day
+        _easter(year) - timedelta(days=2),      # Good Friday
+        _last_weekday(year, 5, 0),              # Memorial Day
+        _observed(date(year, 7, 4)),            # Independence Day
+        _nth_weekday(year, 9, 0, 1),            # Labor Day
+        _nth_weekday(year, 11, 3, 4),           # Thanksgiving
+        _observed(date(year, 12, 25)),          # Christmas
+    }
+    # New Year's Day falling on a Saturday is not observed on the Friday before
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        holidays.add(_observed(new_year))
+    if year >= 2022:
+        holidays.add(_observed(date(year, 6, 19)))  # Juneteenth
+    return frozenset(holidays)
+
+def is_trading_day(day: date) -> bool:
+    return day.weekday() < 5 and day not in nyse_holidays(day.year)
+
+def last_closed_session(now: datetime = None, cutoff: time = MARKET_CLOSE) -> date:
+    """Return the latest trading session whose `cutoff` (default: the close) has passed"""
+    now = now or datetime.now(MARKET_TZ)
+    session = now.date()
+    if now.time() < cutoff:
+        session -= timedelta(days=1)
+    while not is_trading_day(session):
+        session -= timedelta(days=1)
+    return session
+
+def next_market_open(now: datetime = None) -> datetime:
+    """Return the next session open at or after `now` (Eastern time)"""
+    now = now or datetime.now(MARKET_TZ)
+    day = now.date()
+    if now.time() >= MARKET_OPEN:
+        day += timedelta(days=1)
+    while not is_trading_day(day):
+        day += timedelta(days=1)
+    return datetime.combine(day, MARKET_OPEN, tzinfo=MARKET_TZ)
+
+def is_market_open(now: datetime = None, grace: timedelta = timedelta(0)) -> bool:
+    """Return True during regular trading hours, optionally extended past the close"""
+    now = now or datetime.now(MARKET_TZ)
+    if not is_trading_day(now.date()):
+        return False
+    close = datetime.combine(now.date(), MARKET_CLOSE, tzinfo=MARKET_TZ) + grace
+    return MARKET_OPEN <= now.time() and now < close
@@ -0,0 +1,358 @@
+import os
+import asyncio
+import itertools
+import threading
+import requests
+import pandas as pd
+from collections import deque
+from datetime import datetime, timedelta
+import logging
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+
+from market_calendar import MARKET_TZ, is_market_open, next_market_open
+from snowflake_loader import SnowflakeLoader
+from tech_analysis import TechAnalysis
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Keep polling briefly after the close to pick up the final (delayed) quote
+POST_CLOSE_GRACE = timedelta(minutes=15)
+# Upper bound on a single sleep while the market is closed
+MAX_PAUSE_STEP = 15 * 60
+# Exponential backoff after rate limit / quota responses
+RATE_LIMIT_BACKOFF = 60
+MAX_RATE_LIMIT_BACKOFF = 60 * 60
+# Rows held for Snowflake while it is unreachable; the oldest are dropped beyond this
+MAX_UNLOADED_ROWS = 100_000
+
+class RateLimitError(ValueError):
+    """Alpha Vantage returned a rate limit or quota message instead of data"""
+
+class IndicatorState:
+    """Latest bar and incrementally maintained indicators for one symbol.
+
+    Every update is O(1): RSI uses Wilder smoothing, the EMA is a single
+    recurrence and moving averages keep a running sum over a fixed window.
+    Windows are measured in ticks, not days.
+    """
+
+    def __init__(self, symbol: str, history_size: int = 390, rsi_period: int = 14,
+                 ema_period: int = 12, ma_windows=(7, 30)):
+        self.symbol = symbol
+        # Bounded history of recent bars
+        self.bars = deque(maxlen=history_size)
+        self.last_price = None
+
+        # RSI state
+        self.rsi_period = rsi_period
+        self._seed_changes = 0
+        self._avg_gain = 0.0
+        self._avg_loss = 0.0
+        self.rsi = None
+
+        # EMA state
+        self.ema_period = ema_period
+        self._ema_alpha = 2 / (ema_period + 1)
+        self.ema = None
+
+        # Moving average windows and running sums
+        self._windows = {w: deque(maxlen=w) for w in ma_windows}
+        self._sums = {w: 0.0 for w in ma_windows}
+
+    @property
+    def latest_bar(self) -> Optional[Dict]:
+        return self.bars[-1] if self.bars else None
+
+    def _update_rsi(self, change: float) -> None:
+        gain = max(change, 0.0)
+        loss = max(-change, 0.0)
+        if self._seed_changes < self.rsi_period:
+            # Seed with a simple average of the first `rsi_period` changes
+            self._seed_changes += 1
+            self._avg_gain += (gain - self._avg_gain) / self._seed_changes
+            self._avg_loss += (loss - self._avg_loss) / self._seed_changes
+            if self._seed_changes < self.rsi_period:
+                return
+        else:
+            self._avg_gain = (self._avg_gain * (self.rsi_period - 1) + gain) / self.rsi_period
+            self._avg_loss = (self._avg_loss * (self.rsi_period - 1) + loss) / self.rsi_period
+
+        if self._avg_loss == 0:
+            self.rsi = 100.0
+        else:
+            self.rsi = 100 - 100 / (1 + self._avg_gain / self._avg_loss)
+
+    def _update_moving_averages(self, price: float) -> Dict[int, float]:
+        averages = {}
+        for w, window in self._windows.items():
+            if len(window) == window.maxlen:
+                self._sums[w] -= window[0]
+            window.append(price)
+            self._sums[w] += price
+            averages[w] = self._sums[w] / len(window)
+        return averages
+
+    def update(self, bar: Dict) -> Optional[Dict]:
+        """Apply a quote; return the enriched row, or None if nothing changed"""
+        latest = self.latest_bar
+        if latest is not None and all(
+            latest[k] == bar[k] for k in ('price', 'volume', 'latest trading day')
+        ):
+            return None
+
+        price = bar['price']
+        # Measure the first change against the previous session's close
+        reference = self.last_price if self.last_price is not None else bar['previous close']
+        self._update_rsi(price - reference)
+        self.ema = price if self.ema is None else self.ema + self._ema_alpha * (price - self.ema)
+        averages = self._update_moving_averages(price)
+        self.last_price = price
+        self.bars.append(bar)
+
+        row = {
+            'symbol': self.symbol,
+            'quote_timestamp': bar['quote_timestamp'],
+            'trading_day': bar['latest trading day'],
+            'open': bar['open'],
+            'high': bar['high'],
+            'low': bar['low'],
+            'price': price,
+            'volume': bar['volume'],
+            'rsi': self.rsi,
+            f'ema_{self.ema_period}': self.ema
+        }
+        for w, avg in averages.items():
+            row[f'ma_{w}'] = avg
+        return row
+
+class QuoteStream:
+    """Poll GLOBAL_QUOTE round-robin within the API rate budget and micro-batch changes"""
+
+    def __init__(self, api_key: str, symbols: List[str], calls_per_minute: float = 5,
+                 flush_seconds: float = 30, history_size: int = 390, output_dir: str = 'data',
+                 loader: Optional[SnowflakeLoader] = None,
+                 max_unloaded_rows: int = MAX_UNLOADED_ROWS):
+        if calls_per_minute <= 0:
+            raise ValueError(f"calls_per_minute must be positive, got {calls_per_minute}")
+        self.api_key = api_key
+        self.base_url = 'https://www.alphavantage.co/query'
+        self.symbols = symbols
+        # Alpha Vantage free tier allows 5 calls per minute across all symbols
+        self.call_interval = 60 / calls_per_minute
+        self.flush_seconds = flush_seconds
+        self.output_dir = output_dir
+        self.loader = loader
+        self.conn = None
+        self.states = {s: IndicatorState(s, history_size) for s in symbols}
+        # Rows changed since the last flush
+        self.pending = []
+        # Rows written locally but not yet loaded to Snowflake, oldest first
+        self.unloaded = deque()
+        self.max_unloaded_rows = max_unloaded_rows
+        # A final flush can start while a cancelled one is still running in its thread
+        self._write_lock = threading.Lock()
+
+    def _fetch_quote(self, symbol: str) -> Dict:
+        """Fetch the latest quote for a symbol"""
+        params = {
+            'function': 'GLOBAL_QUOTE',
+            'symbol': symbol,
+            'apikey': self.api_key
+        }
+        response = requests.get(self.base_url, params=params, timeout=10)
+        response.raise_for_status()
+        # Quote timestamps are US/Eastern wall time, matching TRADING_DAY and market hours
+        received_at = datetime.now(MARKET_TZ).replace(tzinfo=None)
+
+        # Check for API error and rate limit messages
+        data = response.json()
+        if "Error Message" in data:
+            raise ValueError(f"API Error: {data['Error Message']}")
+        for key in ("Note", "Information"):
+            if key in data:
+                raise RateLimitError(f"API {key}: {data[key]}")
+
+        quote = data.get('Global Quote')
+        if not quote:
+            raise ValueError(f"No quote data found in response for {symbol}")
+
+        # Clean up keys ("05. price" -> "price") and convert numeric values
+        bar = {key.split('. ')[1]: value for key, value in quote.items()}
+        for key in ('open', 'high', 'low', 'price', 'previous close'):
+            bar[key] = float(bar[key])
+        bar['volume'] = int(bar['volume'])
+        bar['quote_timestamp'] = received_at
+        return bar
+
+    async def _wait_for_market(self) -> None:
+        """Sleep while the market is closed; quotes don't change then"""
+        if is_market_open(grace=POST_CLOSE_GRACE):
+            return
+        logger.info(f"Market closed; pausing quote polling until {next_market_open()}")
+        while not is_market_open(grace=POST_CLOSE_GRACE):
+            remaining = (next_market_open() - datetime.now(MARKET_TZ)).total_seconds()
+            # Sleep in bounded steps so clock changes and suspends are picked up
+            await asyncio.sleep(min(max(remaining, 1.0), MAX_PAUSE_STEP))
+        logger.info("Market open; resuming quote polling")
+
+    async def _poll_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_call = loop.time()
+        backoff = RATE_LIMIT_BACKOFF
+        for symbol in itertools.cycle(self.symbols):
+            await self._wait_for_market()
+            await asyncio.sleep(max(0.0, next_call - loop.time()))
+            # Never burst to catch up after a slow request
+            next_call = max(next_call, loop.time()) + self.call_interval
+
+            try:
+                bar = await asyncio.to_thread(self._fetch_quote, symbol)
+            except RateLimitError as e:
+                logger.warning(f"{e}; backing off {backoff}s")
+                next_call = loop.time() + backoff
+                backoff = min(backoff * 2, MAX_RATE_LIMIT_BACKOFF)
+                continue
+            except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+                logger.error(f"Error fetching quote for {symbol}: {e}")
+                continue
+            backoff = RATE_LIMIT_BACKOFF
+
+            row = self.states[symbol].update(bar)
+            if row is not None:
+                self.pending.append(row)
+                logger.info(f"{symbol} price={row['price']} rsi={row['rsi']}")
+
+    def connect_loader(self) -> None:
+        """(Re)open the Snowflake connection and make sure the quote table exists"""
+        self.close_loader()
+        conn = self.loader.connect()
+        try:
+            self.loader.create_tables(conn)
+        except Exception:
+            conn.close()
+            raise
+        self.conn = conn
+
+    def close_loader(self) -> None:
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception as e:
+                logger.warning(f"Error closing Snowflake connection: {e}")
+            self.conn = None
+
+    def _load_batch(self, df: pd.DataFrame) -> None:
+        """Load a batch, reconnecting and retrying once if the session is gone"""
+        if self.conn is None:
+            self.connect_loader()
+            self.loader.load_quote_data(self.conn, df)
+            return
+        try:
+            self.loader.load_quote_data(self.conn, df)
+        except Exception as e:
+            # Idle sessions expire outside market hours
+            logger.warning(f"Quote load failed ({e}); reconnecting to Snowflake")
+            self.connect_loader()
+            self.loader.load_quote_data(self.conn, df)
+
+    def _queue_unloaded(self, rows: List[Dict]) -> None:
+        """Queue rows for Snowflake, dropping the oldest if the queue is full"""
+        self.unloaded.extend(rows)
+        overflow = len(self.unloaded) - self.max_unloaded_rows
+        if overflow > 0:
+            for _ in range(overflow):
+                self.unloaded.popleft()
+            logger.warning(f"Snowflake retry queue full; dropped {overflow} oldest quote rows")
+
+    def _write_batch(self, rows: List[Dict]) -> None:
+        """Append a batch to the local daily quotes file and load it to Snowflake
+
+        Rows that fail to load stay queued and are retried, ahead of newer
+        rows, on the next flush. The local file is only appended once.
+        """
+        with self._write_lock:
+            os.makedirs(self.output_dir, exist_ok=True)
+            filepath = os.path.join(
+                self.output_dir, f"quotes_{datetime.now(MARKET_TZ).strftime('%Y%m%d')}.csv"
+            )
+            pd.DataFrame(rows).to_csv(filepath, mode='a', header=not os.path.exists(filepath), index=False)
+            logger.info(f"Appended {len(rows)} quote rows to {filepath}")
+
+            if self.loader is None:
+                return
+            self._queue_unloaded(rows)
+            try:
+                self._load_batch(pd.DataFrame(list(self.unloaded)))
+                self.unloaded.clear()
+            except Exception as e:
+                logger.error(f"Quote load failed; {len(self.unloaded)} rows queued for retry: {e}")
+
+    async def flush(self) -> None:
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        await asyncio.to_thread(self._write_batch, batch)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            await self.flush()
+
+    async def run(self) -> None:
+        logger.info(
+            f"Streaming quotes for {len(self.symbols)} symbols, "
+            f"one call every {self.call_interval:.1f}s, flushing every {self.flush_seconds}s"
+        )
+        try:
+            await asyncio.gather(self._poll_loop(), self._flush_loop())
+        finally:
+            await self.flush()
+
+def main():
+    load_dotenv()
+
+    # Get API key from environment variable
+    api_key = os.getenv('ALPHA_VANTAGE_API_KEY')
+    if not api_key:
+        raise ValueError("Please set ALPHA_VANTAGE_API_KEY environment variable")
+
+    # Default to the same tech universe as the daily analysis
+    symbols = [s.strip() for s in os.getenv('QUOTE_SYMBOLS', '').split(',') if s.strip()]
+    symbols = symbols or TechAnalysis(api_key).tech_symbols
+
+    # Snowflake is optional; without credentials quotes are stored locally only
+    loader = None
+    try:
+        loader = SnowflakeLoader()
+    except ValueError as e:
+        logger.warning(f"{e}; writing quotes locally only")
+
+    stream = QuoteStream(
+        api_key,
+        symbols,
+        calls_per_minute=float(os.getenv('QUOTE_CALLS_PER_MINUTE', '5')),
+        flush_seconds=float(os.getenv('QUOTE_FLUSH_SECONDS', '30')),
+        history_size=int(os.getenv('QUOTE_HISTORY_SIZE', '390')),
+        loader=loader
+    )
+    try:
+        if loader is not None:
+            # Connector errors at startup don't stop the stream; each flush retries
+            try:
+                stream.connect_loader()
+            except Exception as e:
+                logger.warning(f"Snowflake unavailable ({e}); will retry on the next flush")
+        asyncio.run(stream.run())
+    except KeyboardInterrupt:
+        logger.info("Quote stream stopped")
+    finally:
+        stream.close_loader()
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import os
+import sys
 import glob
 import pandas as pd
 import snowflake.connector
@@ -94,6 +95,26 @@ class SnowflakeLoader:
             )
             """)
             
+            # Create intraday quote table (written by quote_stream.py)
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS TECH_STOCK_QUOTES (
+                SYMBOL VARCHAR(10),
+                QUOTE_TIMESTAMP TIMESTAMP_NTZ,
+                TRADING_DAY DATE,
+                OPEN FLOAT,
+                HIGH FLOAT,
+                LOW FLOAT,
+                PRICE FLOAT,
+                VOLUME INTEGER,
+                RSI FLOAT,
+                EMA_12 FLOAT,
+                MA_7 FLOAT,
+                MA_30 FLOAT,
+                LOAD_TIMESTAMP TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+                PRIMARY KEY (SYMBOL, QUOTE_TIMESTAMP)
+            )
+            """)
+            
             logger.info("Tables created successfully")
             
         except Exception as e:
@@ -158,7 +179,35 @@ class SnowflakeLoader:
             logger.error(f"Error loading GDP data: {e}")
             raise
 
-def main():
+    def load_quote_data(self, conn, df):
+        """Load a micro-batch of intraday quotes into Snowflake"""
+        try:
+            df = df.copy()
+            
+            # Convert column names to uppercase
+            df.columns = df.columns.str.upper()
+            
+            # Format timestamps/dates the same way as the daily loaders
+            df['QUOTE_TIMESTAMP'] = pd.to_datetime(df['QUOTE_TIMESTAMP']).dt.strftime('%Y-%m-%d %H:%M:%S')
+            df['TRADING_DAY'] = pd.to_datetime(df['TRADING_DAY']).dt.strftime('%Y-%m-%d')
+            
+            # Write to Snowflake
+            success, nchunks, nrows, _ = write_pandas(
+                conn=conn,
+                df=df,
+                table_name='TECH_STOCK_QUOTES',
+                database=self.database,
+                schema=self.schema
+            )
+            
+            logger.info(f"Loaded {nrows} quote rows")
+            return nrows
+            
+        except Exception as e:
+            logger.error(f"Error loading quote data: {e}")
+            raise
+
+def main(tech_analysis_file=None, gdp_file=None):
     try:
         # Initialize loader
         loader = SnowflakeLoader()
@@ -169,12 +218,12 @@ def main():
         # Create tables
         loader.create_tables(conn)
         
-        # Load tech sector analysis
-        tech_analysis_file = max(glob.glob('tech_analysis/tech_sector_analysis_*.csv'))
+        # Load tech sector analysis (newest file unless one is given)
+        tech_analysis_file = tech_analysis_file or max(glob.glob('tech_analysis/tech_sector_analysis_*.csv'))
         loader.load_tech_stock_data(conn, tech_analysis_file)
         
         # Load GDP data
-        gdp_file = max(glob.glob('tech_analysis/gdp_data_*.csv'))
+        gdp_file = gdp_file or max(glob.glob('tech_analysis/gdp_data_*.csv'))
         loader.load_gdp_data(conn, gdp_file)
         
         logger.info("Data loading completed successfully")
@@ -187,4 +236,5 @@ def main():
             conn.close()
 
 if __name__ == "__main__":
-    main()
+    # Optional positional args: tech_analysis_file, gdp_file
+    main(*sys.argv[1:3])